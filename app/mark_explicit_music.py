@@ -5,10 +5,10 @@ Explicit Music Labeler - Plex Support
 
 Rules:
 - ALBUM explicit is decided by the album directory name only (parent folder of the track file).
-  If that folder contains "[E]" or the word "Explicit", the ALBUM title gets "[E]" at the front
+  If that folder contains "[E]" or "Explicit" (any case), the ALBUM title gets "[E]" at the front
   and the ALBUM gets an "Explicit" label. Otherwise, album title has "[E]" removed.
 - TRACK explicit is decided by the track FILENAME only (basename), ignoring folders.
-  If the filename contains "[E]" or the word "Explicit", the TRACK title gets "[E]" at the front
+  If the filename contains "[E]" or "Explicit" (any case), the TRACK title gets "[E]" at the front
   and the TRACK gets an "Explicit" label. Otherwise, track title has "[E]" removed.
 - We never touch album sort titles.
 - Titles are edited via unlock -> set -> lock; fallback to direct PUT if needed.
@@ -30,15 +30,30 @@ import os
 import sys
 import re
 import argparse
+import atexit
+import signal
 import platform
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 import json
-from datetime import datetime
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
-from urllib.parse import urljoin
 from plexapi.server import PlexServer
 
+# Optional: orjson serializes several times faster than the stdlib; fall back to compact json
+try:
+    import orjson
+
+    def _dumps(data) -> bytes:
+        return orjson.dumps(data)
+except ImportError:
+    def _dumps(data) -> bytes:
+        return json.dumps(data, separators=(",", ":")).encode()
+
 # Ensure unbuffered output for real-time logging in Docker
 # This is handled by the -u flag when calling python, but we can also set it here
 if hasattr(sys.stdout, 'reconfigure'):
@@ -47,16 +62,30 @@ if hasattr(sys.stdout, 'reconfigure'):
 
 EXPLICIT_LABEL = "Explicit"
 
-# Throttling defaults (seconds)
-DEFAULT_DELAY_AFTER_ALBUM = 0.5
-DEFAULT_DELAY_AFTER_TRACK = 0.2
-DEFAULT_DELAY_AFTER_ARTIST = 1.0
-DEFAULT_DELAY_AFTER_API_CALL = 0.1
+# Throttling defaults (seconds). Optional fixed delays on top of the adaptive backoff below.
+DEFAULT_DELAY_AFTER_ALBUM = 0.0
+DEFAULT_DELAY_AFTER_TRACK = 0.0
+DEFAULT_DELAY_AFTER_ARTIST = 0.0
+DEFAULT_DELAY_AFTER_API_CALL = 0.0
+
+# Adaptive throttling: back off only when Plex (or a proxy in front of it) signals pressure
+RATE_LIMIT_HEADROOM = 0.1  # pause once fewer than 10% of the rate-limit window remains
+LATENCY_TARGET = 1.0       # edit (non-GET) responses slower than this earn the server an equal pause
+
+# Concurrency: albums in flight grow additively on success and halve on 429/5xx
+DEFAULT_MAX_WORKERS = 16
+MAX_RETRY_AFTER = 60.0
+LISTING_PAGE_SIZE = 10000  # items per listing request (plexapi defaults to 100, i.e. one request per 100 items)
+LABEL_LISTING_PARAMS = {"includeFields": "labels"}  # ask listings to carry each item's <Label> tags
+HTTP_POOL_SIZE = 32  # keep-alive connections per host; comfortably above the max worker count
+DEFAULT_BACKOFF = 1.0
 
 # Progress tracking
 DATA_DIR = os.getenv("DATA_DIR", os.path.dirname(__file__))
 PROGRESS_FILE = os.path.join(DATA_DIR, ".progress.json")
-PROCESSED_ALBUMS_FILE = os.path.join(DATA_DIR, ".processed_albums.json")
+PROCESSED_ALBUMS_FILE = os.path.join(DATA_DIR, ".processed_albums.jsonl")  # append-only, one JSON string per line
+LEGACY_PROCESSED_ALBUMS_FILE = os.path.join(DATA_DIR, ".processed_albums.json")
+PROCESSED_ALBUMS_FLUSH_EVERY = 50  # albums buffered in memory between appends to the processed log
 
 # Forced headers (static & ASCII-safe)
 DEVICE_NAME = "media-script"
@@ -70,51 +99,47 @@ USER_AGENT = (
 
 # Markers
 E_TOKEN = "[E]"
-LEADING_E = re.compile(r"^\s*\[E\]\s*", re.IGNORECASE)
-TRAILING_E = re.compile(r"\s*\[E\]\s*$", re.IGNORECASE)
-INLINE_E = re.compile(r"\[E\]", re.IGNORECASE)
-MULTISPACE = re.compile(r"\s{2,}")
-EXPLICIT_WORD_RE = re.compile(r"\bexplicit\b", re.IGNORECASE)
+# One pass: a run of [E] tokens (with surrounding whitespace) or a run of 2+ whitespace chars
+STRIP_E_RE = re.compile(r"(?:\s*\[E\])+\s*|\s{2,}", re.IGNORECASE)
+
+def _strip_e_repl(match):
+    # Drop the tokens; the whitespace left behind collapses to one space if it's 2+ chars
+    gap = "".join(c for c in match.group(0) if c.isspace())
+    return " " if len(gap) > 1 else gap
 
 def strip_e(title: str) -> str:
     if not title:
         return title
-    t = LEADING_E.sub("", title)
-    t = TRAILING_E.sub("", t)
-    t = INLINE_E.sub("", t)
-    t = MULTISPACE.sub(" ", t).strip()
-    return t
+    return STRIP_E_RE.sub(_strip_e_repl, title).strip()
 
 def apply_front(title: str) -> str:
     base = strip_e(title or "")
     return f"{E_TOKEN} {base}".strip() if base else E_TOKEN
 
 # ---------- path helpers ----------
+_SEP = os.sep
+
 def get_all_part_paths(track):
-    paths = []
-    try:
-        track.reload()
-    except Exception:
-        pass
+    # Tracks come from a library-wide listing with Media/Part inlined, so no reload is needed here.
+    # Generator: detection callers stop at the first path they can decide on.
     try:
         if getattr(track, "media", None):
             for media in track.media:
                 if getattr(media, "parts", None):
                     for part in media.parts:
                         if getattr(part, "file", None):
-                            paths.append(str(part.file))
+                            yield str(part.file)
     except Exception:
         pass
-    return paths
 
 def track_filename_is_explicit(track, verbose=False):
     """Decide TRACK explicitness by filename (basename) only."""
     any_part = False
     for p in get_all_part_paths(track):
         any_part = True
-        base = os.path.basename(p)
+        base = p.rpartition(_SEP)[2]
         bl = base.lower()
-        hit = ("[e]" in bl) or (EXPLICIT_WORD_RE.search(base) is not None)
+        hit = ("[e]" in bl) or ("explicit" in bl)
         if verbose:
             print(f"      • track filename check: {base} -> {'EXPLICIT' if hit else 'clean'}")
         if hit:
@@ -124,6 +149,9 @@ def track_filename_is_explicit(track, verbose=False):
         print("      • track filename check: no media parts found -> clean")
     return False
 
+# Album folder path -> explicit verdict, shared by every album/track living in that folder
+_ALBUM_DIR_CACHE = {}
+
 def album_folder_is_explicit(album, sample_track=None, verbose=False):
     """
     Decide ALBUM explicitness by album directory (parent folder of the track file).
@@ -136,8 +164,13 @@ def album_folder_is_explicit(album, sample_track=None, verbose=False):
         tracks = []
     for t in tracks:
         for p in get_all_part_paths(t):
-            album_dir = os.path.basename(os.path.dirname(p))
-            hit = ("[e]" in album_dir.lower()) or (EXPLICIT_WORD_RE.search(album_dir) is not None)
+            full = p.rpartition(_SEP)[0]
+            album_dir = full.rpartition(_SEP)[2]
+            hit = _ALBUM_DIR_CACHE.get(full)
+            if hit is None:
+                dl = album_dir.lower()
+                hit = ("[e]" in dl) or ("explicit" in dl)
+                _ALBUM_DIR_CACHE[full] = hit
             if verbose:
                 print(f"      • album folder check: {album_dir} -> {'EXPLICIT' if hit else 'clean'}")
             return hit
@@ -145,10 +178,69 @@ def album_folder_is_explicit(album, sample_track=None, verbose=False):
         print("      • album folder check: no paths found -> clean")
     return False
 
+def group_tracks_by_artist_album(tracks):
+    """Bucket a flat track listing as {artist ratingKey: {album ratingKey: [tracks]}}, preserving listing order."""
+    albums_by_artist = {}
+    for track in tracks:
+        albums = albums_by_artist.setdefault(track.grandparentRatingKey, {})
+        albums.setdefault(track.parentRatingKey, []).append(track)
+    return albums_by_artist
+
+class LazyAlbum:
+    """Album known from its tracks' parent fields; the Plex object is fetched only when something needs it."""
+    type = "album"
+
+    def __init__(self, plex, rating_key, title):
+        self._plex = plex
+        self._title = title
+        self._item = None
+        self.ratingKey = rating_key
+
+    @property
+    def title(self):
+        return self._item.title if self._item is not None else self._title
+
+    def __getattr__(self, name):
+        # Anything beyond ratingKey/title (labels, edit, lockField, ...) needs the real album
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._item is None:
+            self._item = self._plex.fetchItem(self.ratingKey)
+        return getattr(self._item, name)
+
 # ---------- labels ----------
+# ratingKey -> lowercased label tags, primed per library from the bulk listings so has_label()
+# needs no per-item fetch
+_LABELS = {}
+
+def prime_labels(items):
+    """
+    Seed _LABELS from listed items' own <Label> elements (listings are requested with
+    LABEL_LISTING_PARAMS). Reads the raw XML, so partial objects never auto-reload.
+    """
+    for item in items:
+        _LABELS[item.ratingKey] = {(el.get("tag") or "").lower() for el in item._data.findall("Label")}
+
+def list_album_labels(plex, section, album_keys, artist_filtered):
+    """Prime _LABELS for a library's albums; warns (and leaves them to has_label's fallback) on failure."""
+    try:
+        if artist_filtered:
+            # Few albums: fetch them by key (full metadata always carries labels)
+            albums = plex.fetchItems(list(album_keys)) if album_keys else []
+        else:
+            albums = section.fetchItems(section._buildSearchKey(libtype="album"),
+                                        container_size=LISTING_PAGE_SIZE, params=LABEL_LISTING_PARAMS)
+        prime_labels(albums)
+    except Exception as e:
+        print(f"WARNING: Could not preload album labels ({e}); album labels will be read per album")
+
 def has_label(item, label: str) -> bool:
+    wanted = label.lower()
+    tags = _LABELS.get(item.ratingKey)
+    if tags is not None:
+        return wanted in tags
     try:
-        return any(getattr(l, "tag", "").lower() == label.lower() for l in (item.labels or []))
+        return any(getattr(l, "tag", "").lower() == wanted for l in (item.labels or []))
     except Exception:
         return False
 
@@ -157,8 +249,9 @@ def add_label_if_missing(item, label: str, dry_run: bool, delay=DEFAULT_DELAY_AF
         if dry_run:
             print(f"  - DRY RUN: would add label '{label}' to {item.type}: {item.title}")
         else:
-            time.sleep(delay)
+            pause_if_needed(delay)
             item.addLabel(label)
+            _LABELS.setdefault(item.ratingKey, set()).add(label.lower())
             print(f"  - Added label '{label}' to {item.type}: {item.title}")
 
 def remove_label_if_present(item, label: str, dry_run: bool, delay=DEFAULT_DELAY_AFTER_API_CALL):
@@ -167,21 +260,23 @@ def remove_label_if_present(item, label: str, dry_run: bool, delay=DEFAULT_DELAY
             if dry_run:
                 print(f"  - DRY RUN: would remove label '{label}' from {item.type}: {item.title}")
             else:
-                time.sleep(delay)
+                pause_if_needed(delay)
                 item.removeLabel(label)
+                _LABELS.get(item.ratingKey, set()).discard(label.lower())
                 print(f"  - Removed label '{label}' from {item.type}: {item.title}")
     except Exception:
         pass
 
 # ---------- robust title edit ----------
-def put_metadata_direct(session, baseurl, token, rating_key, fields: dict) -> bool:
-    url = urljoin(baseurl if baseurl.endswith('/') else baseurl + '/', f"library/metadata/{rating_key}")
-    params = {"X-Plex-Token": token}
-    params.update(fields)
-    resp = session.put(url, params=params)
+def metadata_url_prefix(baseurl: str) -> str:
+    """'<baseurl>/library/metadata/' computed once per run; rating keys are appended per call."""
+    return (baseurl if baseurl.endswith('/') else baseurl + '/') + "library/metadata/"
+
+def put_metadata_direct(session, metadata_url, token, rating_key, fields: dict) -> bool:
+    resp = session.put(metadata_url + str(rating_key), params={"X-Plex-Token": token, **fields})
     return resp.ok
 
-def edit_title_unlock_set_lock(item, new_title: str, dry_run: bool, prefix: str, session=None, baseurl=None, token=None, delay=DEFAULT_DELAY_AFTER_API_CALL):
+def edit_title_unlock_set_lock(item, new_title: str, dry_run: bool, prefix: str, session=None, metadata_url=None, token=None, delay=DEFAULT_DELAY_AFTER_API_CALL):
     curr = item.title or ""
     if curr == new_title:
         return
@@ -191,26 +286,26 @@ def edit_title_unlock_set_lock(item, new_title: str, dry_run: bool, prefix: str,
     try:
         if hasattr(item, "unlockField"):
             item.unlockField("title")
-        time.sleep(delay)
+        pause_if_needed(delay)
         item.edit(**{"title.value": new_title})
-        time.sleep(delay)
+        pause_if_needed(delay)
         if hasattr(item, "lockField"):
             item.lockField("title")
-        time.sleep(delay)
-        item.refresh(); item.reload()
+        # reload() is enough to verify the edit. refresh() makes Plex rescan the item's metadata,
+        # which is slow server-side; if ever needed, do it once per library after the run.
+        item.reload()
         if (item.title or "") == new_title:
             print(f"{prefix}- Updated title: '{item.title}'")
             return
     except Exception:
         pass
     try:
-        if session and baseurl and token:
-            time.sleep(delay)
-            ok = put_metadata_direct(session, baseurl, token, item.ratingKey,
+        if session and metadata_url and token:
+            pause_if_needed(delay)
+            ok = put_metadata_direct(session, metadata_url, token, item.ratingKey,
                                      {"title.value": new_title, "title.locked": 1})
             if ok:
-                time.sleep(delay)
-                item.refresh(); item.reload()
+                item.reload()
                 if (item.title or "") == new_title:
                     print(f"{prefix}- Updated title (direct PUT): '{item.title}'")
                     return
@@ -218,11 +313,51 @@ def edit_title_unlock_set_lock(item, new_title: str, dry_run: bool, prefix: str,
         pass
     print(f"{prefix}- WARN: failed to update title '{curr}'")
 
+# ---------- throttling ----------
+_PAUSE_LOCK = threading.Lock()
+_pause_until = 0.0  # time.monotonic() deadline shared by all workers
+
+def backoff(seconds: float):
+    """Ask every worker to hold off sending requests for the next `seconds`."""
+    global _pause_until
+    if seconds <= 0:
+        return
+    with _PAUSE_LOCK:
+        _pause_until = max(_pause_until, time.monotonic() + seconds)
+
+def pause_if_needed(delay: float = 0.0):
+    """Sleep only while a backoff is pending, then for the optional fixed `delay`."""
+    wait = _pause_until - time.monotonic()
+    if wait > 0:
+        time.sleep(wait)
+    if delay > 0:
+        time.sleep(delay)
+
+def parse_retry_after(value) -> float:
+    """Seconds to wait from a Retry-After header (delta-seconds form only); 0 if absent/invalid."""
+    try:
+        return min(max(float(value), 0.0), MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        return 0.0
+
+def rate_limit_exhausted(headers) -> bool:
+    """True when X-RateLimit-Remaining/-Limit headers show less than RATE_LIMIT_HEADROOM left."""
+    try:
+        remaining = float(headers["X-RateLimit-Remaining"])
+        limit = float(headers["X-RateLimit-Limit"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return limit > 0 and remaining / limit < RATE_LIMIT_HEADROOM
+
 # ---------- forced-header session ----------
 class ForcedHeaderSession(requests.Session):
-    def prepare_request(self, request):
-        prepared = super().prepare_request(request)
-        forced = {
+    # Set by main() so 429/5xx responses can shrink the album concurrency limit
+    controller = None
+
+    def __init__(self):
+        super().__init__()
+        # All values are ASCII, so they can be applied as-is on every request
+        self._forced = {
             "User-Agent": USER_AGENT,
             "X-Plex-Product": PRODUCT,
             "X-Plex-Device-Name": DEVICE_NAME,
@@ -232,19 +367,76 @@ class ForcedHeaderSession(requests.Session):
             "X-Plex-Platform-Version": platform.python_version(),
             "X-Plex-Version": "1.0",
         }
-        prepared.headers.update(forced)
-        # latin-1 clean
-        safe = {}
-        for k, v in prepared.headers.items():
-            try:
-                safe_v = v.encode("latin-1", "ignore").decode("latin-1")
-            except Exception:
-                safe_v = ""
-            safe[k] = safe_v
-        prepared.headers.clear(); prepared.headers.update(safe)
+        # Reuse keep-alive connections across worker threads; transient 429/5xx are retried by urllib3
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE,
+            pool_maxsize=HTTP_POOL_SIZE,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                              respect_retry_after_header=True, raise_on_status=False),
+        )
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def send(self, request, **kwargs):
+        pause_if_needed()
+        resp = super().send(request, **kwargs)
+        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+        failed = resp.status_code == 429 or resp.status_code >= 500
+        # Retries absorbed by urllib3 still mean Plex pushed back; one overload signal per request
+        retries = getattr(resp.raw, "retries", None)
+        if (failed or (retries is not None and retries.history)) and self.controller is not None:
+            self.controller.on_overload()
+        if failed or rate_limit_exhausted(resp.headers):
+            backoff(retry_after or DEFAULT_BACKOFF)
+        # Only edits are judged on latency: large listing pages are legitimately slow reads
+        if request.method not in ("GET", "HEAD"):
+            elapsed = resp.elapsed.total_seconds()
+            if elapsed > LATENCY_TARGET:
+                backoff(min(elapsed, MAX_RETRY_AFTER))
+        return resp
+
+    def prepare_request(self, request):
+        prepared = super().prepare_request(request)
+        prepared.headers.update(self._forced)
         return prepared
 
+# ---------- concurrency ----------
+class ConcurrencyController:
+    """AIMD gate on albums in flight: +0.5 per completed album, halved when Plex reports overload."""
+
+    def __init__(self, c_max=DEFAULT_MAX_WORKERS, c_min=1):
+        self.c_min = c_min
+        self.c_max = max(c_min, c_max)
+        self.c = float(c_min)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Block until another album may start under the current limit."""
+        with self._cond:
+            while self._in_flight >= int(self.c):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self.c = min(self.c_max, self.c + 0.5)
+            self._cond.notify_all()
+
+    def on_overload(self):
+        with self._cond:
+            self.c = max(self.c_min, self.c * 0.5)
+
 # ---------- progress tracking ----------
+# Albums finish on worker threads; serialize writes to the progress files.
+# Re-entrant so the SIGTERM handler can flush while the main thread is mid-write.
+_PROGRESS_LOCK = threading.RLock()
+
 def load_progress():
     """Load progress state from file."""
     if os.path.exists(PROGRESS_FILE):
@@ -262,58 +454,204 @@ def save_progress(library_name, artist_key, album_key, processed_artists):
         progress_dir = os.path.dirname(PROGRESS_FILE)
         if progress_dir:
             os.makedirs(progress_dir, exist_ok=True)
-        with open(PROGRESS_FILE, 'w') as f:
-            json.dump({
-                "last_library": library_name,
-                "last_artist": artist_key,
-                "last_album": album_key,
-                "processed_artists": processed_artists,
-                "timestamp": datetime.now().isoformat()
-            }, f, indent=2)
+        data = _dumps({
+            "last_library": library_name,
+            "last_artist": artist_key,
+            "last_album": album_key,
+            "processed_artists": processed_artists,
+            "timestamp": time.time()  # epoch seconds; informational only
+        })
+        # Write-then-rename so a crash never leaves a truncated progress file
+        tmp_file = PROGRESS_FILE + ".tmp"
+        with _PROGRESS_LOCK:
+            with open(tmp_file, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_file, PROGRESS_FILE)
     except Exception:
         pass
 
 def clear_progress():
     """Clear progress state."""
-    for f in [PROGRESS_FILE, PROCESSED_ALBUMS_FILE]:
+    for f in [PROGRESS_FILE, PROCESSED_ALBUMS_FILE, LEGACY_PROCESSED_ALBUMS_FILE]:
         if os.path.exists(f):
             try:
                 os.remove(f)
             except Exception:
                 pass
 
+def migrate_legacy_processed_albums():
+    """Move album keys from the old single-JSON cache into the append-only log."""
+    try:
+        with open(LEGACY_PROCESSED_ALBUMS_FILE, 'r') as f:
+            albums = json.load(f).get("albums", [])
+        with open(PROCESSED_ALBUMS_FILE, 'a') as f:
+            f.writelines(json.dumps(key) + "\n" for key in albums)
+        os.remove(LEGACY_PROCESSED_ALBUMS_FILE)
+    except Exception:
+        pass
+
 def load_processed_albums():
     """Load set of processed album keys."""
+    if os.path.exists(LEGACY_PROCESSED_ALBUMS_FILE):
+        migrate_legacy_processed_albums()
+    processed = set()
     if os.path.exists(PROCESSED_ALBUMS_FILE):
         try:
+            line = ""
             with open(PROCESSED_ALBUMS_FILE, 'r') as f:
-                data = json.load(f)
-                return set(data.get("albums", []))
+                for line in f:
+                    try:
+                        processed.add(json.loads(line))
+                    except ValueError:
+                        pass  # torn final line from an interrupted run
+            if line and not line.endswith("\n"):
+                # Terminate the torn line so the next append starts on a fresh one
+                with open(PROCESSED_ALBUMS_FILE, 'a') as f:
+                    f.write("\n")
+        except Exception:
+            pass
+    return processed
+
+_pending_albums = []
+
+def flush_processed_albums():
+    """Append buffered album keys to the processed log."""
+    with _PROGRESS_LOCK:
+        if not _pending_albums:
+            return
+        keys = list(_pending_albums)
+        _pending_albums.clear()
+        try:
+            # Ensure directory exists
+            albums_dir = os.path.dirname(PROCESSED_ALBUMS_FILE)
+            if albums_dir:
+                os.makedirs(albums_dir, exist_ok=True)
+            with open(PROCESSED_ALBUMS_FILE, 'a') as f:
+                f.writelines(json.dumps(key) + "\n" for key in keys)
         except Exception:
             pass
-    return set()
 
 def save_processed_album(album_key):
-    """Add an album to the processed set."""
-    processed = load_processed_albums()
-    processed.add(album_key)
-    try:
-        # Ensure directory exists
-        albums_dir = os.path.dirname(PROCESSED_ALBUMS_FILE)
-        if albums_dir:
-            os.makedirs(albums_dir, exist_ok=True)
-        with open(PROCESSED_ALBUMS_FILE, 'w') as f:
-            json.dump({
-                "albums": list(processed),
-                "last_updated": datetime.now().isoformat()
-            }, f, indent=2)
-    except Exception:
-        pass
+    """Mark an album processed; keys reach the log in batches of PROCESSED_ALBUMS_FLUSH_EVERY."""
+    with _PROGRESS_LOCK:
+        _pending_albums.append(album_key)
+        full = len(_pending_albums) >= PROCESSED_ALBUMS_FLUSH_EVERY
+    if full:
+        flush_processed_albums()
+
+_resume_point = None
+
+def advance_resume_point(in_flight):
+    """
+    Record where a resumed run must start. `in_flight` holds (future, library, artist_key, album_key)
+    in submission order; albums finish out of order, so progress points at the earliest one not yet
+    finished (or, once all are done, the last one). Called from the main thread only.
+    """
+    global _resume_point
+    point = None
+    while in_flight and in_flight[0][0].done():
+        point = in_flight.popleft()[1:]
+    if in_flight:
+        point = in_flight[0][1:]
+    if point is not None and point != _resume_point:
+        _resume_point = point
+        save_progress(*point, [])
+
+def exit_on_sigterm(signum, frame):
+    """`docker stop` sends SIGTERM, which skips atexit: flush buffered keys now, then exit normally."""
+    flush_processed_albums()
+    raise SystemExit(128 + signum)
 
 def get_album_key(library_name, artist_title, album_title, album_rating_key):
     """Generate a unique key for an album (includes library name for multi-library support)."""
     return f"{library_name}|||{artist_title}|||{album_title}|||{album_rating_key}"
 
+# ---------- album processing ----------
+def process_album(album, tracks, album_key, library_name, artist_key, artist_title, args, session, metadata_url):
+    """Apply title/label rules to one album and its tracks. Returns (tracks_checked, titles_updated, albums_updated)."""
+    tracks_checked = 0
+    titles_updated = 0
+    albums_updated = 0
+    track_count = len(tracks)
+    print(f"    Processing {track_count} track(s) for album: {album.title}", flush=True)
+
+    try:
+        # Decide album explicit from ALBUM FOLDER (use first track as sample for folder)
+        sample_track = tracks[0] if tracks else None
+        album_is_explicit = album_folder_is_explicit(album, sample_track=sample_track, verbose=args.verbose)
+
+        # Apply album title
+        desired_album_title = apply_front(album.title or "") if album_is_explicit else strip_e(album.title or "")
+        if desired_album_title != (album.title or ""):
+            albums_updated += 1
+            action = "mark" if album_is_explicit else "unmark"
+            print(f"    * Album title {action}: {album.title}")
+            edit_title_unlock_set_lock(album, desired_album_title, args.dry_run, prefix="    ",
+                                       session=session, metadata_url=metadata_url, token=args.token,
+                                       delay=args.delay_api)
+
+        # Album label
+        if album_is_explicit:
+            add_label_if_missing(album, EXPLICIT_LABEL, args.dry_run, delay=args.delay_api)
+        elif args.remove_labels:
+            remove_label_if_present(album, EXPLICIT_LABEL, args.dry_run, delay=args.delay_api)
+
+        # Tracks: decide explicit from FILENAME ONLY
+        for track in tracks:
+            tracks_checked += 1
+            is_explicit = track_filename_is_explicit(track, verbose=args.verbose)
+
+            # Progress update every 10 tracks or on last track
+            if tracks_checked % 10 == 0 or tracks_checked == track_count:
+                print(f"    Progress ({album.title}): {tracks_checked}/{track_count} tracks processed...", flush=True)
+
+            # Cheap checks first: an explicit title already led by a single "[E] " (or a clean title
+            # without any [E]) is left alone, so the common already-correct case costs nothing.
+            curr = track.title or ""
+            curr_lower = curr.lower()
+            needs_tag = is_explicit and (not curr.startswith(f"{E_TOKEN} ") or curr_lower.count("[e]") > 1)
+            needs_strip = (not is_explicit) and ("[e]" in curr_lower)
+            if needs_tag or needs_strip:
+                desired = apply_front(curr) if is_explicit else strip_e(curr)
+                if desired != curr:
+                    titles_updated += 1
+                    print(f"    Track {'mark' if is_explicit else 'unmark'}: {curr}")
+                    edit_title_unlock_set_lock(track, desired, args.dry_run, prefix="    ",
+                                               session=session, metadata_url=metadata_url, token=args.token,
+                                               delay=args.delay_api)
+
+            if is_explicit:
+                add_label_if_missing(track, EXPLICIT_LABEL, args.dry_run, delay=args.delay_api)
+            elif args.remove_labels:
+                remove_label_if_present(track, EXPLICIT_LABEL, args.dry_run, delay=args.delay_api)
+
+            pause_if_needed(args.delay_track)
+
+        # Mark album as processed (the resume point is tracked by main(), in submission order)
+        if not args.dry_run:
+            save_processed_album(album_key)
+
+        print(f"    ✓ Completed album: {album.title} ({tracks_checked} tracks)", flush=True)
+        pause_if_needed(args.delay_album)
+
+    except Exception as e:
+        print(f"    - ERROR processing album: {e}")
+        print(f"    - Not marked processed; will be retried next run: Library '{library_name}' / {artist_title} / {album.title}")
+
+    return tracks_checked, titles_updated, albums_updated
+
+def run_album_job(controller, *job):
+    """Worker entry point: process one album, then free its concurrency slot."""
+    try:
+        result = process_album(*job)
+        controller.on_success()
+        return result
+    except Exception as e:
+        print(f"    - ERROR processing album: {e}")
+        return 0, 0, 0
+    finally:
+        controller.release()
+
 # ---------- main ----------
 def main():
     ap = argparse.ArgumentParser(description="Enforce [E] from album folder (album) and filename (track). Remove wrong [E].")
@@ -348,10 +686,12 @@ def main():
     delay_artist_default = safe_float_env("DELAY_AFTER_ARTIST", DEFAULT_DELAY_AFTER_ARTIST)
     delay_api_default = safe_float_env("DELAY_AFTER_API_CALL", DEFAULT_DELAY_AFTER_API_CALL)
     
-    ap.add_argument("--delay-album", type=float, default=delay_album_default, help=f"Delay after processing album (default: {delay_album_default}s, env: DELAY_AFTER_ALBUM)")
-    ap.add_argument("--delay-track", type=float, default=delay_track_default, help=f"Delay after processing track (default: {delay_track_default}s, env: DELAY_AFTER_TRACK)")
-    ap.add_argument("--delay-artist", type=float, default=delay_artist_default, help=f"Delay after processing artist (default: {delay_artist_default}s, env: DELAY_AFTER_ARTIST)")
-    ap.add_argument("--delay-api", type=float, default=delay_api_default, help=f"Delay after API call (default: {delay_api_default}s, env: DELAY_AFTER_API_CALL)")
+    ap.add_argument("--delay-album", type=float, default=delay_album_default, help=f"Extra fixed delay after each album (default: {delay_album_default}s, env: DELAY_AFTER_ALBUM)")
+    ap.add_argument("--delay-track", type=float, default=delay_track_default, help=f"Extra fixed delay after each track (default: {delay_track_default}s, env: DELAY_AFTER_TRACK)")
+    ap.add_argument("--delay-artist", type=float, default=delay_artist_default, help=f"Extra fixed delay after each artist (default: {delay_artist_default}s, env: DELAY_AFTER_ARTIST)")
+    ap.add_argument("--delay-api", type=float, default=delay_api_default, help=f"Extra fixed delay before each write API call (default: {delay_api_default}s, env: DELAY_AFTER_API_CALL)")
+    max_workers_default = max(1, int(safe_float_env("MAX_WORKERS", DEFAULT_MAX_WORKERS)))
+    ap.add_argument("--max-workers", type=int, default=max_workers_default, help=f"Upper bound on albums processed concurrently; the live limit adapts to Plex load (default: {max_workers_default}, env: MAX_WORKERS)")
     ap.add_argument("--clear-progress", action="store_true", help="Clear progress and processed albums cache")
     ap.set_defaults(resume=True)
     args = ap.parse_args()
@@ -369,6 +709,9 @@ def main():
     # Load progress and processed albums
     progress = load_progress() if args.resume else {}
     processed_albums = set() if args.force else load_processed_albums()
+    # Buffered keys must reach disk even if the run is interrupted, stopped, or exits early
+    atexit.register(flush_processed_albums)
+    signal.signal(signal.SIGTERM, exit_on_sigterm)
     
     if args.resume and progress.get("last_library"):
         print(f"Resuming from: Library '{progress.get('last_library')}' / {progress.get('last_artist')} / {progress.get('last_album', 'N/A')}")
@@ -377,39 +720,44 @@ def main():
     if args.force:
         print("Force mode: will reprocess all albums")
 
+    metadata_url = metadata_url_prefix(args.baseurl)
+    controller = ConcurrencyController(c_max=args.max_workers)
     session = ForcedHeaderSession()
+    session.controller = controller
     try:
         plex = PlexServer(args.baseurl, args.token, session=session)
     except Exception as e:
         print(f"ERROR: Connect failed: {e}", file=sys.stderr); sys.exit(1)
 
-    # Determine which libraries to process
+    # Determine which libraries to process as (section, name) pairs; section is None until resolved by name
     libraries_to_process = []
     if args.all_libraries:
-        # Find all music libraries
+        # Find all music libraries, keeping the section objects so they aren't looked up again by name
         try:
             all_sections = plex.library.sections()
-            for section in all_sections:
-                if section.type == "artist":  # Music libraries have type "artist"
-                    libraries_to_process.append(section.title)
+            libraries_to_process = [(section, section.title) for section in all_sections
+                                    if section.type == "artist"]  # Music libraries have type "artist"
             if not libraries_to_process:
                 print("ERROR: No music libraries found on server.", file=sys.stderr)
                 sys.exit(1)
-            print(f"Found {len(libraries_to_process)} music library/libraries: {', '.join(libraries_to_process)}")
+            print(f"Found {len(libraries_to_process)} music library/libraries: {', '.join(name for _, name in libraries_to_process)}")
         except Exception as e:
             print(f"ERROR: Failed to list libraries: {e}", file=sys.stderr)
             sys.exit(1)
     elif args.library:
         # Use specified libraries
-        libraries_to_process = args.library
+        libraries_to_process = [(None, name) for name in args.library]
     else:
         # Default to "Music" or from env var
         default_lib = os.getenv("PLEX_LIBRARY", "Music")
-        libraries_to_process = [default_lib]
+        libraries_to_process = [(None, default_lib)]
 
     total_tracks_checked = 0
     total_titles_updated = 0
     total_albums_updated = 0
+    executor = ThreadPoolExecutor(max_workers=controller.c_max)
+    futures = []
+    in_flight = deque()  # (future, library, artist_key, album_key) in submission order, for progress
     
     # Resume logic
     resume_library = progress.get("last_library")
@@ -421,7 +769,7 @@ def main():
     found_resume_point = False
 
     # Process each library
-    for library_name in libraries_to_process:
+    for music, library_name in libraries_to_process:
         # Resume logic: skip until we find the resume library
         if skip_until_library and not found_resume_point:
             if library_name == skip_until_library:
@@ -437,17 +785,37 @@ def main():
             print(f"Processing Library: {library_name}")
             print(f"{'='*60}")
 
-        try:
-            music = plex.library.section(library_name)
-        except Exception as e:
-            print(f"ERROR: Library '{library_name}': {e}")
+        if music is None:
+            try:
+                music = plex.library.section(library_name)
+            except Exception as e:
+                print(f"ERROR: Library '{library_name}': {e}")
+                continue
+        if music.type != "artist":
+            print(f"ERROR: Library '{library_name}' is not a music library (type: {music.type}), skipping")
             continue
 
-        artists = music.search(libtype="artist", title=args.artist) if args.artist else music.search(libtype="artist")
+        artists = music.search(libtype="artist", title=args.artist, container_size=LISTING_PAGE_SIZE)
         if args.artist and not artists:
             print(f"No artists matched '{args.artist}' in library '{library_name}'.")
             continue
 
+        # Fetch every track (with file paths) in one listing instead of album.tracks() + track.reload() per item
+        # (labels included, so has_label() is answered from the listing too)
+        try:
+            if args.artist:
+                library_tracks = [t for artist in artists
+                                  for t in artist.tracks(container_size=LISTING_PAGE_SIZE, params=LABEL_LISTING_PARAMS)]
+            else:
+                library_tracks = music.fetchItems(music._buildSearchKey(libtype="track"),
+                                                  container_size=LISTING_PAGE_SIZE, params=LABEL_LISTING_PARAMS)
+        except Exception as e:
+            print(f"ERROR: Failed to list tracks in library '{library_name}': {e}")
+            continue
+        albums_by_artist = group_tracks_by_artist_album(library_tracks)
+        prime_labels(library_tracks)
+        list_album_labels(plex, music, [k for albums in albums_by_artist.values() for k in albums], bool(args.artist))
+
         total_artists = len(artists)
         artist_count = 0
         print(f"\nFound {total_artists} artist(s) to process\n")
@@ -475,22 +843,17 @@ def main():
                 skip_until_album = None
             
             print(f"\n[{artist_count}/{total_artists}] Artist: {artist.title}", flush=True)
-            try:
-                albums = artist.albums()
-            except Exception as e:
-                print(f"  - Skipping artist (albums error): {e}", flush=True)
-                continue
-            
-            album_count = len(albums)
+            # Albums come from the track listing; no per-artist albums() request
+            artist_albums = albums_by_artist.get(artist.ratingKey, {})
+            album_count = len(artist_albums)
             print(f"  Found {album_count} album(s)", flush=True)
             
-            # Sleep after successfully getting albums (outside try block to avoid masking sleep errors)
-            if args.delay_artist > 0:
-                time.sleep(args.delay_artist)
+            pause_if_needed(args.delay_artist)
 
             album_num = 0
-            for album in albums:
+            for album_rating_key, tracks in artist_albums.items():
                 album_num += 1
+                album = LazyAlbum(plex, album_rating_key, tracks[0].parentTitle)
                 album_key = get_album_key(library_name, artist.title, album.title or "", str(album.ratingKey))
                 
                 # Resume logic: skip until we find the resume album
@@ -508,88 +871,24 @@ def main():
                     print(f"    - Skipping (already processed)")
                     continue
                 
-                try:
-                    tracks = album.tracks()
-                    track_count = len(tracks)
-                    print(f"    Processing {track_count} track(s)...", flush=True)
-                    time.sleep(args.delay_api)
-                except Exception as e:
-                    print(f"    - Skipping album (tracks error): {e}")
-                    continue
-
-                try:
-                    # Decide album explicit from ALBUM FOLDER (use first track as sample for folder)
-                    sample_track = tracks[0] if tracks else None
-                    album_is_explicit = album_folder_is_explicit(album, sample_track=sample_track, verbose=args.verbose)
-                    time.sleep(args.delay_api)
-
-                    # Apply album title
-                    desired_album_title = apply_front(album.title or "") if album_is_explicit else strip_e(album.title or "")
-                    if desired_album_title != (album.title or ""):
-                        total_albums_updated += 1
-                        action = "mark" if album_is_explicit else "unmark"
-                        print(f"    * Album title {action}: {album.title}")
-                        edit_title_unlock_set_lock(album, desired_album_title, args.dry_run, prefix="    ",
-                                                   session=session, baseurl=args.baseurl, token=args.token,
-                                                   delay=args.delay_api)
-
-                    # Album label
-                    if album_is_explicit:
-                        add_label_if_missing(album, EXPLICIT_LABEL, args.dry_run, delay=args.delay_api)
-                    elif args.remove_labels:
-                        remove_label_if_present(album, EXPLICIT_LABEL, args.dry_run, delay=args.delay_api)
-
-                    # Tracks: decide explicit from FILENAME ONLY
-                    tracks_processed = 0
-                    for track in tracks:
-                        total_tracks_checked += 1
-                        tracks_processed += 1
-                        is_explicit = track_filename_is_explicit(track, verbose=args.verbose)
-                        time.sleep(args.delay_api)
-                        
-                        # Progress update every 10 tracks or on last track
-                        if tracks_processed % 10 == 0 or tracks_processed == track_count:
-                            print(f"    Progress: {tracks_processed}/{track_count} tracks processed...", flush=True)
-
-                        if is_explicit:
-                            desired = apply_front(track.title or "")
-                            if desired != (track.title or ""):
-                                total_titles_updated += 1
-                                print(f"    Track mark: {track.title}")
-                                edit_title_unlock_set_lock(track, desired, args.dry_run, prefix="    ",
-                                                           session=session, baseurl=args.baseurl, token=args.token,
-                                                           delay=args.delay_api)
-                            add_label_if_missing(track, EXPLICIT_LABEL, args.dry_run, delay=args.delay_api)
-                        else:
-                            if "[e]" in (track.title or "").lower():
-                                cleaned = strip_e(track.title or "")
-                                if cleaned != (track.title or ""):
-                                    total_titles_updated += 1
-                                    print(f"    Track unmark: {track.title}")
-                                    edit_title_unlock_set_lock(track, cleaned, args.dry_run, prefix="    ",
-                                                               session=session, baseurl=args.baseurl, token=args.token,
-                                                               delay=args.delay_api)
-                            if args.remove_labels:
-                                remove_label_if_present(track, EXPLICIT_LABEL, args.dry_run, delay=args.delay_api)
-                        
-                        time.sleep(args.delay_track)
-                    
-                    # Mark album as processed
-                    if not args.dry_run:
-                        save_processed_album(album_key)
-                    
-                    # Save progress after each album
-                    save_progress(library_name, artist_key, album_key, [])
-                    
-                    print(f"    ✓ Completed album: {album.title} ({tracks_processed} tracks)", flush=True)
-                    time.sleep(args.delay_album)
-                    
-                except Exception as e:
-                    print(f"    - ERROR processing album: {e}")
-                    print(f"    - Progress saved, can resume from: Library '{library_name}' / {artist.title} / {album.title}")
-                    # Save progress even on error
-                    save_progress(library_name, artist_key, album_key, [])
-                    continue
+                controller.acquire()
+                fut = executor.submit(run_album_job, controller, album, tracks, album_key,
+                                      library_name, artist_key, artist.title, args, session, metadata_url)
+                futures.append(fut)
+                in_flight.append((fut, library_name, artist_key, album_key))
+                advance_resume_point(in_flight)
+
+    # Keep the resume point moving while the last albums finish
+    while in_flight:
+        wait([job[0] for job in in_flight], return_when=FIRST_COMPLETED)
+        advance_resume_point(in_flight)
+    executor.shutdown(wait=True)
+    flush_processed_albums()
+    for fut in futures:
+        tracks_checked, titles_updated, albums_updated = fut.result()
+        total_tracks_checked += tracks_checked
+        total_titles_updated += titles_updated
+        total_albums_updated += albums_updated
 
     # Clear progress on successful completion
     if not args.dry_run:
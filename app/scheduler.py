@@ -9,14 +9,30 @@ and handles log rotation before each run.
 
 import os
 import sys
+import errno
+import functools
 import subprocess
 import shutil
-import re
-from pathlib import Path
+import time
+import threading
+import concurrent.futures
 from datetime import datetime
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
 
+# Optional: python-isal's igzip is a drop-in gzip replacement backed by ISA-L (SIMD DEFLATE/CRC32),
+# producing the same .gz format several times faster. Fall back to the stdlib when it isn't installed.
+try:
+    from isal import igzip as _gz
+except ImportError:
+    import gzip as _gz
+
+# Optional: zstandard, used when LOG_COMPRESSOR=zstd
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 # Ensure unbuffered output for real-time logging in Docker
 # This is also handled by the -u flag, but we set it here as well for safety
 if hasattr(sys.stdout, 'reconfigure'):
@@ -28,65 +44,223 @@ else:
 
 # Environment variables
 LOG_FILE = os.getenv("LOG_FILE", "/app/logs/explicit-labeler.log")
+LOG_DIR = os.path.dirname(LOG_FILE) or "."
+LOG_NAME = os.path.basename(LOG_FILE)
 LOG_RETENTION_RUNS = int(os.getenv("LOG_RETENTION_RUNS", "7"))
 APP_TIMES = os.getenv("APP_TIMES", "02:00")
 RUN_AT_START = os.getenv("RUN_AT_START", "true").lower() in ("true", "1", "yes")
+LOG_COMPRESSOR = os.getenv("LOG_COMPRESSOR", "gzip").strip().lower()
+LOG_COMPRESS_LEVEL = os.getenv("LOG_COMPRESS_LEVEL", "").strip()
+
+# Chunk size for streaming the log into the compressor: 1 MiB means far fewer read/write calls
+# than shutil's default, while staying far below gzip's 2**31-byte single-write limit
+COPY_BUFSIZE = 1024 * 1024
+
+# Suffixes a rotated log may carry; all are shifted so switching compressors keeps history
+ROTATED_SUFFIXES = ("", ".gz", ".zst")
 
 # Validate LOG_RETENTION_RUNS
 if LOG_RETENTION_RUNS < 1:
     LOG_RETENTION_RUNS = 7
 
+# Validate LOG_COMPRESSOR / LOG_COMPRESS_LEVEL (gzip: 1-9, default 1; zstd: 1-22, default 3)
+if LOG_COMPRESSOR == "zstd" and zstandard is None:
+    print("WARNING: LOG_COMPRESSOR=zstd but the 'zstandard' package is not installed; using gzip", file=sys.stderr)
+    LOG_COMPRESSOR = "gzip"
+elif LOG_COMPRESSOR not in ("gzip", "zstd"):
+    LOG_COMPRESSOR = "gzip"
+_level_default, _level_max = (3, 22) if LOG_COMPRESSOR == "zstd" else (1, 9)
+try:
+    LOG_COMPRESS_LEVEL = int(LOG_COMPRESS_LEVEL)
+except ValueError:
+    LOG_COMPRESS_LEVEL = _level_default
+if not 1 <= LOG_COMPRESS_LEVEL <= _level_max:
+    LOG_COMPRESS_LEVEL = _level_default
+COMPRESSED_SUFFIX = ".zst" if LOG_COMPRESSOR == "zstd" else ".gz"
+
+# Timestamp format for log file lines
+_TS_FMT = "%Y-%m-%d %H:%M:%S"
+
+# Held for the whole of a labeler run; schedules firing meanwhile skip instead of overlapping
+_RUN_LOCK = threading.Lock()
+
+# Compresses the rotated log while the labeler runs; one worker keeps rotations in order
+_ROT_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-compress")
+_COMPRESS_FUTURE = None
+
+# Append handle kept open by log_messages() between calls; closed on rotation
+_LOG_FH = None
+# Set once LOG_DIR is known to exist, so reopening the log skips the mkdir
+_LOG_DIR_READY = False
+
+def open_compressed(path):
+    """Open `path` for binary writing through the configured compressor."""
+    if LOG_COMPRESSOR == "zstd":
+        return zstandard.ZstdCompressor(level=LOG_COMPRESS_LEVEL).stream_writer(open(path, 'wb'))
+    return _gz.open(path, 'wb', compresslevel=LOG_COMPRESS_LEVEL)
+
+def remove_file(path):
+    """Unlink `path`, ignoring a missing file (Path.unlink(missing_ok=True) without the Path)."""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+def copy_file(src, dst):
+    """
+    Copy bytes in-kernel with copy_file_range where supported, falling back to a plain
+    read/write copy. The destination size is checked against the source before returning.
+    """
+    with open(src, 'rb') as f_in, open(dst, 'wb') as f_out:
+        src_size = os.fstat(f_in.fileno()).st_size
+        if hasattr(os, "copy_file_range"):
+            try:
+                while os.copy_file_range(f_in.fileno(), f_out.fileno(), 1 << 30):
+                    pass
+            except OSError:
+                # e.g. older kernels refusing cross-filesystem ranges
+                pass
+        if os.fstat(f_out.fileno()).st_size != src_size:
+            # Short or refused in-kernel copy: redo it from scratch through user space
+            f_in.seek(0)
+            f_out.seek(0)
+            f_out.truncate()
+            shutil.copyfileobj(f_in, f_out, COPY_BUFSIZE)
+            f_out.flush()
+        if os.fstat(f_out.fileno()).st_size != src_size:
+            raise OSError(errno.EIO, f"Incomplete copy of {src} to {dst}")
+
+def move_file(src, dst):
+    """Atomic rename, with an in-kernel copy + unlink only when crossing filesystems."""
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # copy_file() raises on a size mismatch, so the source is only removed after a full copy
+        try:
+            copy_file(src, dst)
+        except OSError:
+            remove_file(dst)
+            raise
+        shutil.copystat(src, dst)
+        os.unlink(src)
+
 def rotate_logs():
     """Rotate log file before each run (Python implementation of cron-wrapper.sh logic)."""
-    log_path = Path(LOG_FILE)
+    global _COMPRESS_FUTURE
+    # The slots below are about to shift; the last run's -1.log must be compressed first
+    wait_for_compression()
     
-    if not log_path.exists():
+    # Release our handle so the file can be moved (Windows) and later writes go to the new log
+    close_log()
+    
+    # Plain strings throughout: every slot is an f-string + os.path.join, no Path objects per iteration
+    log_dir = LOG_DIR
+    log_name = LOG_NAME
+    
+    # One directory read answers every "does this rotation slot exist?" question below
+    try:
+        entries = {entry.name for entry in os.scandir(log_dir)}
+    except FileNotFoundError:
+        entries = set()
+    
+    if log_name not in entries:
         # Ensure log directory exists
-        log_path.parent.mkdir(parents=True, exist_ok=True)
+        ensure_log_dir()
         return
     
-    log_dir = log_path.parent
-    log_base = log_path.stem  # filename without extension
-    log_ext = log_path.suffix  # .log
+    log_base, log_ext = os.path.splitext(log_name)  # filename without extension, .log
     
-    # Remove oldest log if we're at the retention limit
-    oldest_log = log_dir / f"{log_base}-{LOG_RETENTION_RUNS}{log_ext}"
-    if oldest_log.exists():
-        oldest_log.unlink()
+    # Remove oldest log (whatever its compression) if we're at the retention limit
+    # Only names present in the listing are unlinked; ENOENT (removed meanwhile) is ignored
+    for suffix in ROTATED_SUFFIXES:
+        oldest_name = f"{log_base}-{LOG_RETENTION_RUNS}{log_ext}{suffix}"
+        if oldest_name in entries:
+            remove_file(os.path.join(log_dir, oldest_name))
     
     # Shift existing rotated logs backwards (move .2 to .3, .1 to .2, etc.)
+    # Slot i-1 is never touched before this step reaches it, so the listing stays accurate.
     for i in range(LOG_RETENTION_RUNS, 1, -1):
         prev = i - 1
-        prev_log = log_dir / f"{log_base}-{prev}{log_ext}"
-        curr_log = log_dir / f"{log_base}-{i}{log_ext}"
-        
-        # Move previous to current position
-        if prev_log.exists():
-            shutil.move(str(prev_log), str(curr_log))
-    
-    # Move the current log to -1.log
-    if log_path.exists():
-        rotated_log = log_dir / f"{log_base}-1{log_ext}"
-        shutil.move(str(log_path), str(rotated_log))
+        for suffix in ROTATED_SUFFIXES:
+            prev_name = f"{log_base}-{prev}{log_ext}{suffix}"
+            curr_name = f"{log_base}-{i}{log_ext}{suffix}"
+            
+            # Move previous to current position
+            if prev_name in entries:
+                move_file(os.path.join(log_dir, prev_name), os.path.join(log_dir, curr_name))
+    
+    # Rename the current log to -1.log now (cheap); the gzip/zstd pass runs in the background
+    rotated_log = os.path.join(log_dir, f"{log_base}-1{log_ext}")
+    move_file(LOG_FILE, rotated_log)
+    _COMPRESS_FUTURE = _ROT_POOL.submit(compress_rotated_log, rotated_log)
 
-def log_message(message):
-    """Append a message to the log file with timestamp."""
-    log_path = Path(LOG_FILE)
-    log_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(log_path, 'a') as f:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        f.write(f"[{timestamp}] {message}\n")
+def compress_rotated_log(rotated_log):
+    """Compress a rotated log to .gz (or .zst) in place of the plain file."""
+    rotated_log_compressed = rotated_log + COMPRESSED_SUFFIX
+    try:
+        with open(rotated_log, 'rb') as f_in, open_compressed(rotated_log_compressed) as f_out:
+            shutil.copyfileobj(f_in, f_out, COPY_BUFSIZE)
+        os.unlink(rotated_log)
+    except Exception:
+        # Compression failed - keep the log uncompressed rather than lose it
+        remove_file(rotated_log_compressed)
+
+def wait_for_compression():
+    """Block until the previous rotation's background compression has finished."""
+    if _COMPRESS_FUTURE is not None:
+        _COMPRESS_FUTURE.result()
+
+def ensure_log_dir():
+    """Create LOG_DIR the first time it's needed; later calls are a flag check."""
+    global _LOG_DIR_READY
+    if not _LOG_DIR_READY:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        _LOG_DIR_READY = True
+
+def close_log():
+    """Close the cached log handle; the next log_messages() reopens LOG_FILE."""
+    global _LOG_FH
+    if _LOG_FH is not None:
+        _LOG_FH.close()
+        _LOG_FH = None
+
+def log_messages(lines, timestamp=None):
+    """Append several timestamped lines to the log file in a single write."""
+    global _LOG_FH
+    if _LOG_FH is None or _LOG_FH.closed:
+        ensure_log_dir()
+        # Line buffered: each call is a single write(2), no open/close per line
+        _LOG_FH = open(LOG_FILE, 'a', buffering=1, encoding='utf-8')
+    
+    if timestamp is None:
+        timestamp = time.strftime(_TS_FMT)
+    prefix = f"[{timestamp}] "
+    _LOG_FH.write("".join(f"{prefix}{line}\n" for line in lines))
+
+def log_message(message, timestamp=None):
+    """Append a message to the log file with timestamp (current time unless given)."""
+    log_messages((message,), timestamp)
 
 def run_labeler():
-    """Run the mark_explicit_music.py script."""
+    """Run the mark_explicit_music.py script (skipped if a run is already in progress)."""
+    if not _RUN_LOCK.acquire(blocking=False):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+        print(f"{timestamp}| Previous run still in progress, skipping this one.", flush=True)
+        return None
+    try:
+        return _run_labeler()
+    finally:
+        _RUN_LOCK.release()
+
+def _run_labeler():
     # Rotate logs before running
     rotate_logs()
     
     # Log run start
-    log_message("=" * 60)
-    log_message(f"Started scheduled run at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    log_message("=" * 60)
+    now_str = time.strftime(_TS_FMT)
+    log_messages(("=" * 60, f"Started scheduled run at {now_str}", "=" * 60), now_str)
     
     # Print to stdout for Docker logs visibility
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
@@ -100,29 +274,28 @@ def run_labeler():
     
     # Run the script and capture output
     try:
-        # Run with unbuffered output - write to both log file and stdout for visibility
-        with open(LOG_FILE, 'a') as log_f:
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                env=os.environ.copy(),
-                text=True,
-                bufsize=1  # Line buffered
-            )
-            
+        # Run with unbuffered output - write to both log file and stdout for visibility.
+        # Bytes end to end: the child's output is never decoded/re-encoded on this side.
+        # Hand the file over to this one writer so banner/child/footer lines can't interleave.
+        close_log()
+        with open(LOG_FILE, 'ab', buffering=0) as log_f, subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            close_fds=True,
+        ) as process:
             # Stream output to both log file and stdout
+            stdout = sys.stdout.buffer
             for line in process.stdout:
                 log_f.write(line)
-                log_f.flush()
-                print(line.rstrip(), flush=True)
+                stdout.write(line)
+                stdout.flush()
             
             exit_code = process.wait()
         
         # Log completion
-        log_message(f"Finished at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        log_message(f"Exit code: {exit_code}")
-        log_message("")
+        now_str = time.strftime(_TS_FMT)
+        log_messages((f"Finished at {now_str}", f"Exit code: {exit_code}", ""), now_str)
         
         # Print completion to stdout
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
@@ -131,8 +304,7 @@ def run_labeler():
         return exit_code
     except Exception as e:
         error_msg = f"ERROR running script: {e}"
-        log_message(error_msg)
-        log_message("")
+        log_messages((error_msg, ""))
         
         # Print error to stdout
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
@@ -140,9 +312,10 @@ def run_labeler():
         
         return 1
 
-def parse_schedule(time_str):
+@functools.lru_cache(maxsize=None)
+def build_trigger(time_str):
     """
-    Parse military time format (HH:MM) into CronTrigger parameters.
+    Parse military time format (HH:MM) into a daily CronTrigger.
     
     Format: HH:MM (24-hour format)
     Examples:
@@ -150,32 +323,26 @@ def parse_schedule(time_str):
         "14:00"         -> daily at 2 PM
         "00:30"         -> daily at 12:30 AM
     
-    Returns dict with fields for apscheduler CronTrigger.
+    Returns an apscheduler CronTrigger; identical strings share one cached trigger.
     """
     time_str = time_str.strip()
     
-    # Match HH:MM format where HH is 00-23 and MM is 00-59
-    pattern = r'^([0-1]?[0-9]|2[0-3]):([0-5][0-9])$'
-    if not re.match(pattern, time_str):
+    # Match HH:MM format where HH is 0-23 (one or two digits) and MM is 00-59.
+    # Plain string checks instead of a regex; isascii() keeps int() from
+    # accepting "1_0" or non-ASCII digits.
+    hour_str, sep, minute_str = time_str.partition(':')
+    if not (sep and 1 <= len(hour_str) <= 2 and len(minute_str) == 2
+            and (hour_str + minute_str).isascii() and (hour_str + minute_str).isdigit()):
         raise ValueError(f"Invalid time format: {time_str}. Expected HH:MM format (e.g., 02:00, 14:00)")
     
-    hour_str, minute_str = time_str.split(':')
     hour = int(hour_str)
     minute = int(minute_str)
     
-    # Validate ranges (should already be validated by regex, but double-check)
     if not (0 <= hour <= 23 and 0 <= minute <= 59):
-        raise ValueError(f"Invalid time values: hour={hour}, minute={minute}")
-    
-    # Return parameters for daily schedule (minute hour day month weekday)
-    # Use None for "*" (any value) for day, month, and weekday
-    return {
-        "minute": str(minute),
-        "hour": str(hour),
-        "day": None,  # "*" -> None for any day
-        "month": None,  # "*" -> None for any month
-        "day_of_week": None,  # "*" -> None for any weekday
-    }
+        raise ValueError(f"Invalid time format: {time_str}. Expected HH:MM format (e.g., 02:00, 14:00)")
+    
+    # Daily schedule: day, month and weekday are left out, which CronTrigger treats as "*"
+    return CronTrigger(hour=hour, minute=minute)
 
 def format_time_display(time_str):
     """
@@ -184,34 +351,32 @@ def format_time_display(time_str):
     """
     return f"Daily at {time_str}"
 
-def main():
-    """Main scheduler entry point."""
-    # Parse APP_TIMES - support comma-separated multiple schedules
+def parse_app_times(app_times):
+    """
+    Turn comma-separated APP_TIMES into a tuple of (CronTrigger, "HH:MM") pairs.
+    Raises SystemExit with the error message on empty or invalid input.
+    """
     # Split by comma and strip whitespace
-    schedule_strings = [s.strip() for s in APP_TIMES.split(",") if s.strip()]
+    schedule_strings = [s.strip() for s in app_times.split(",") if s.strip()]
     
     if not schedule_strings:
-        print(f"ERROR: APP_TIMES is empty or invalid: '{APP_TIMES}'", file=sys.stderr)
-        sys.exit(1)
+        raise SystemExit(f"ERROR: APP_TIMES is empty or invalid: '{app_times}'")
     
     triggers = []
-    for idx, schedule_str in enumerate(schedule_strings):
+    for schedule_str in schedule_strings:
         try:
-            # Store original format for display
-            original_format = schedule_str
-            schedule_params = parse_schedule(schedule_str)
-            # Create CronTrigger - apscheduler accepts None for "*" (any value)
-            trigger = CronTrigger(
-                minute=schedule_params["minute"],
-                hour=schedule_params["hour"],
-                day=schedule_params["day"],
-                month=schedule_params["month"],
-                day_of_week=schedule_params["day_of_week"],
-            )
-            triggers.append((trigger, original_format))
+            triggers.append((build_trigger(schedule_str), schedule_str))
         except Exception as e:
-            print(f"ERROR: Failed to parse schedule '{schedule_str}' in APP_TIMES: {e}", file=sys.stderr)
-            sys.exit(1)
+            raise SystemExit(f"ERROR: Failed to parse schedule '{schedule_str}' in APP_TIMES: {e}")
+    return tuple(triggers)
+
+# APP_TIMES never changes after startup, so schedules are resolved (and validated) on import,
+# before any RUN_AT_START run
+_TRIGGERS = parse_app_times(APP_TIMES)
+
+def main():
+    """Main scheduler entry point."""
+    triggers = _TRIGGERS
     
     # Display formatted startup banner (ImageMaid style)
     banner_width = 100
@@ -258,7 +423,7 @@ def main():
         print(f"{timestamp}| Initial run complete. Scheduler will continue on schedule.", flush=True)
         print(flush=True)
     
-    # Create scheduler
+    # Create scheduler (default thread pool; overlapping runs are prevented by run_labeler's lock)
     scheduler = BlockingScheduler()
     
     # Add scheduled jobs for each trigger
@@ -269,7 +434,11 @@ def main():
             trigger=trigger,
             id=job_id,
             name=f"Run explicit labeler ({schedule_str})",
-            replace_existing=True
+            replace_existing=True,
+            # At most one pending run; a burst of missed fires (e.g. after suspend) becomes one
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=3600,
         )
     
     # Flush all output before starting the blocking scheduler
@@ -0,0 +1,40 @@
+import os
+import sys
+import xml.etree.ElementTree as ET
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "app"))
+
+from plexapi.audio import Track
+
+import mark_explicit_music as m
+
+# A track as it appears in a library listing: partial, and carrying no <Label> elements
+LISTED_TRACK = '<Track ratingKey="42" key="/library/metadata/42" type="track" title="Song" />'
+LISTED_LABELLED_TRACK = ('<Track ratingKey="43" key="/library/metadata/43" type="track" title="Song">'
+                         '<Label id="1" tag="Explicit" /></Track>')
+
+
+def listed_track(xml):
+    return Track(mock.MagicMock(), ET.fromstring(xml), initpath="/library/sections/1/all")
+
+
+def test_has_label_on_unlabelled_partial_track_does_not_reload():
+    track = listed_track(LISTED_TRACK)
+    m.prime_labels([track])
+    with mock.patch.object(Track, "_reload", side_effect=AssertionError("reloaded")) as reload:
+        assert not m.has_label(track, m.EXPLICIT_LABEL)
+        reload.assert_not_called()
+        # Sanity check: reading .labels on the same object is what would have reloaded
+        try:
+            track.labels
+        except AssertionError:
+            pass
+        assert reload.called
+
+
+def test_prime_labels_reads_label_elements():
+    track = listed_track(LISTED_LABELLED_TRACK)
+    m.prime_labels([track])
+    with mock.patch.object(Track, "_reload", side_effect=AssertionError("reloaded")):
+        assert m.has_label(track, "explicit")